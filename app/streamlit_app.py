@@ -8,7 +8,9 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from scripts.embeddings import get_embeddings_provider
-from scripts.vectorstore import create_or_load_chroma  
+from scripts.vectorstore import create_or_load_chroma, get_index_generation
+from scripts.query_cache import QueryCache
+from scripts.faiss_store import FAISS_INDEX_PATH, load_faiss_store
 
 from langchain.chat_models import init_chat_model
 from langchain_core.documents import Document
@@ -18,9 +20,37 @@ st.set_page_config(page_title="Drive RAG Chatbot", layout="centered")
 st.title("Drive RAG Chatbot")
 
 # ---- Load embeddings and vector DB ----
-embeddings = get_embeddings_provider()
+# Loaded once per server process (model load + compile warm-up are not repeated on reruns)
+@st.cache_resource
+def load_embeddings():
+    return get_embeddings_provider()
+
+embeddings = load_embeddings()
 vectordb = create_or_load_chroma(embeddings)
-retriever = vectordb.as_retriever(search_kwargs={"k": 4})
+TOP_K = 4  # number of chunks retrieved per question
+
+# ---- In-process FAISS index built by the ETL run (reloaded when it changes); Chroma is the fallback ----
+@st.cache_resource(max_entries=1)
+def load_retrieval_index(mtime):
+    return load_faiss_store()
+
+faiss_store = load_retrieval_index(
+    os.path.getmtime(FAISS_INDEX_PATH) if os.path.exists(FAISS_INDEX_PATH) else None
+)
+
+def retrieve(query_vector, k=TOP_K):
+    if faiss_store is not None:
+        return faiss_store.search(query_vector, k=k)
+    return vectordb.similarity_search_by_vector(query_vector, k=k)
+
+# ---- Semantic answer cache (shared across reruns, reset after every ETL ingest) ----
+@st.cache_resource(max_entries=1)
+def load_query_cache(version, dim):
+    return QueryCache(version=version, dim=dim)
+
+query_cache = load_query_cache(
+    get_index_generation(), embeddings.model.get_sentence_embedding_dimension()
+)
 
 # ---- Configure OpenRouter LLM (OpenAI-compatible endpoint) ----
 llm = init_chat_model("openai:gpt-4o-mini", temperature=0.0)
@@ -41,18 +71,24 @@ Answer:"""
 query = st.text_input("Ask a question about the Drive documents:")
 
 if query:
-    with st.spinner("Retrieving relevant chunks..."):
-        docs = retriever.invoke(query)
+    query_vector = embeddings.embed_query(query)
+    answer = query_cache.lookup(query_vector)
+
+    if answer is None:
+        with st.spinner("Retrieving relevant chunks..."):
+            docs = retrieve(query_vector)
 
-    if not docs:
-        st.warning("No documents found in the vector store. Run the ETL ingest first.")
-    else:
-        prompt = build_prompt(query, docs)
+        if not docs:
+            st.warning("No documents found in the vector store. Run the ETL ingest first.")
+        else:
+            prompt = build_prompt(query, docs)
 
-        with st.spinner("Generating answer..."):
-            response = llm.invoke(prompt)
-            answer = getattr(response, "content", str(response))
+            with st.spinner("Generating answer..."):
+                response = llm.invoke(prompt)
+                answer = getattr(response, "content", str(response))
+            query_cache.add(query, query_vector, answer)
 
+    if answer is not None:
         st.subheader("Answer:")
         st.write(answer)
 
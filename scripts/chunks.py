@@ -0,0 +1,64 @@
+# scripts/chunks.py
+from dataclasses import dataclass, field
+import numpy as np
+
+
+@dataclass
+class Chunks:
+    """
+    Column-oriented batch of text chunks: ids[i], texts[i] and metadatas[i]
+    describe the same chunk.
+    """
+    ids: list = field(default_factory=list)
+    texts: list = field(default_factory=list)
+    metadatas: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, chunk_id, text, metadata):
+        self.ids.append(chunk_id)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+
+    def extend(self, other):
+        self.ids.extend(other.ids)
+        self.texts.extend(other.texts)
+        self.metadatas.extend(other.metadatas)
+
+
+def chunk_word_spans(words, chunk_size=800, overlap=100):
+    """
+    Compute (start, end) word spans so each chunk holds at most chunk_size characters
+    (counting one separator per word) and repeats up to `overlap` characters of
+    trailing words from the previous chunk. Boundaries come from prefix sums.
+    Every span ends past the previous one, so each word is covered without
+    emitting redundant suffix chunks.
+    """
+    if not words:
+        return []
+
+    lens = np.fromiter((len(w) + 1 for w in words), dtype=np.int64, count=len(words))
+    prefix = np.concatenate(([0], np.cumsum(lens)))
+    n = len(words)
+
+    def span_end(start):
+        end = int(np.searchsorted(prefix, prefix[start] + chunk_size, side="right")) - 1
+        return max(end, start + 1)  # a single over-long word still forms a chunk
+
+    spans = []
+    start = 0
+    prev_end = 0
+    while start < n:
+        end = span_end(start)
+        if end <= prev_end:
+            # The overlap tail leaves no room for the next word: restart without overlap
+            start = prev_end
+            end = span_end(start)
+        spans.append((start, end))
+        prev_end = end
+        if end >= n:
+            break
+        next_start = int(np.searchsorted(prefix, prefix[end] - overlap, side="left"))
+        start = max(next_start, start + 1)
+    return spans
@@ -1,5 +1,4 @@
 # scripts/drive_utils.py
-import io
 import os
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
@@ -8,6 +7,11 @@ from google.oauth2 import service_account
 
 SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
 
+# Download tuning
+DOWNLOAD_CHUNK_BYTES = 16 * 1024 * 1024
+SINGLE_REQUEST_MAX_BYTES = 20 * 1024 * 1024
+WRITE_BUFFER_BYTES = 1024 * 1024
+
 def build_drive_service(credentials_json_path):
     """
     Build a Google Drive API service using service account credentials.
@@ -50,7 +54,7 @@ def list_files_in_folder(service, folder_id, mime_type=None):
         results = service.files().list(
             q=q,
             pageSize=1000,
-            fields="files(id,name,mimeType,modifiedTime)"
+            fields="files(id,name,mimeType,modifiedTime,size)"
         ).execute()
 
         files = results.get("files", [])
@@ -64,9 +68,11 @@ def list_files_in_folder(service, folder_id, mime_type=None):
     return []
 
 
-def download_file(service, file_id, dest_path):
+def download_file(service, file_id, dest_path, size=None):
     """
     Download a single file from Google Drive to a specified local path.
+    Files with a known size under SINGLE_REQUEST_MAX_BYTES are fetched in one request;
+    larger or unknown-size files are streamed in DOWNLOAD_CHUNK_BYTES chunks.
     """
     if not service:
         print("[ERROR] No valid Google Drive service instance provided.")
@@ -74,16 +80,22 @@ def download_file(service, file_id, dest_path):
 
     try:
         print(f"[INFO] Starting download for file ID: {file_id}")
-        request = service.files().get_media(fileId=file_id)
-
         os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-        with io.FileIO(dest_path, "wb") as fh:
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-                if status:
-                    print(f"[INFO] Download progress: {int(status.progress() * 100)}%")
+
+        if size is not None and int(size) <= SINGLE_REQUEST_MAX_BYTES:
+            # Small file: one plain GET, no resumable download session
+            data = service.files().get_media(fileId=file_id).execute()
+            with open(dest_path, "wb") as fh:
+                fh.write(data)
+        else:
+            request = service.files().get_media(fileId=file_id)
+            with open(dest_path, "wb", buffering=WRITE_BUFFER_BYTES) as fh:
+                downloader = MediaIoBaseDownload(fh, request, chunksize=DOWNLOAD_CHUNK_BYTES)
+                done = False
+                while not done:
+                    status, done = downloader.next_chunk()
+                    if status:
+                        print(f"[INFO] Download progress: {int(status.progress() * 100)}%")
 
         print(f"[INFO] File downloaded successfully to: {dest_path}")
         return dest_path
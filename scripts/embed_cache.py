@@ -0,0 +1,105 @@
+# scripts/embed_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+# Default on-disk embedding cache location
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./data/embed_cache.sqlite")
+
+# Max cached vectors; least recently used entries are evicted beyond this
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", 200000))
+
+# Stay below SQLite's limit on bound parameters per statement
+_LOOKUP_BATCH_SIZE = 500
+
+
+def make_key(model_name, text):
+    """SHA-256 key for a (model, text) pair."""
+    return hashlib.sha256((model_name + "\x00" + text).encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed LRU cache of float32 embedding vectors keyed by make_key().
+    Holds at most `max_entries` vectors, evicting by last access time.
+    Safe to share across threads; access is serialized with a lock.
+    """
+
+    def __init__(self, path=EMBED_CACHE_PATH, max_entries=EMBED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vec BLOB NOT NULL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+            if "last_access" not in columns:
+                self._conn.execute(
+                    "ALTER TABLE embeddings ADD COLUMN last_access REAL NOT NULL DEFAULT 0"
+                )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)"
+            )
+
+    def get_many(self, keys):
+        """Return a dict {key: np.ndarray} for the keys present in the cache."""
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH_SIZE):
+                batch = keys[start:start + _LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM embeddings WHERE hash IN ({placeholders})", batch
+                ).fetchall()
+                for h, vec in rows:
+                    found[h] = np.frombuffer(vec, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE hash = ?",
+                        [(now, h) for h in found]
+                    )
+        return found
+
+    def put_many(self, keys, vectors):
+        """Store vectors for the given keys in a single transaction, then enforce the size cap."""
+        now = time.time()
+        rows = [
+            (k, np.asarray(v, dtype=np.float32).tobytes(), now)
+            for k, v in zip(keys, vectors)
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, vec, last_access) VALUES (?, ?, ?)", rows
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE hash IN "
+                    "(SELECT hash FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (excess,)
+                )
+
+
+def open_embedding_cache(path=EMBED_CACHE_PATH):
+    """Open the embedding cache, or return None if it cannot be used."""
+    try:
+        cache = EmbeddingCache(path)
+        print(f"[INFO] Using embedding cache at {path}")
+        return cache
+    except Exception as e:
+        print(f"[WARN] Embedding cache unavailable ({path}): {e}")
+        return None
@@ -1,6 +1,314 @@
 # scripts/embeddings.py
 import os
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import atexit
+import contextlib
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+from langchain_core.embeddings import Embeddings
+from scripts.embed_cache import make_key, open_embedding_cache
+
+try:
+    from optimum.bettertransformer import BetterTransformer
+except ImportError:
+    BetterTransformer = None
+
+# Token-length bucket boundaries: (0-64], (64-128], (128-256], (256-512], >512
+BUCKET_BOUNDARIES = [64, 128, 256, 512]
+# Per-bucket batch size relative to the base batch size (short buckets take bigger batches)
+BUCKET_BATCH_SCALE = [2.0, 1.0, 0.5, 0.25, 0.25]
+
+SUPPORTED_PRECISIONS = ("fp16", "bf16", "fp32")
+
+# Int8 ONNX export produced by scripts/quantize_embed.py (used on CPU-only hosts)
+QUANTIZED_MODEL_DIR = os.getenv("QUANTIZED_EMBEDDING_MODEL_DIR", "./models/minilm-int8")
+QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+# Records which LOCAL_EMBEDDING_MODEL the int8 export was built from
+QUANTIZED_SOURCE_FILE = "source_model.txt"
+
+# Multi-process encode pool, used only for large buckets:
+# auto = multi-GPU hosts only, cpu = also CPU workers on 8+ core hosts, off = never
+EMBED_POOL = os.getenv("EMBED_POOL", "auto").lower()
+EMBED_POOL_MIN_TEXTS = 1024
+CPU_POOL_MIN_CORES = 8
+CPU_POOL_WORKERS = 4
+
+# torch.compile the encoder (EMBED_COMPILE=0 disables)
+EMBED_COMPILE = os.getenv("EMBED_COMPILE", "1") == "1"
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """
+    LangChain-compatible embeddings that call SentenceTransformer.encode directly.
+    The whole corpus is encoded in large batches instead of small per-text calls.
+    """
+
+    def __init__(self, model_name, device=None, batch_size=None, cache=None, onnx_file=None):
+        self.model_name = model_name
+        self.cache = cache
+        self.device = "cpu" if onnx_file else (device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        default_batch_size = 64 if self.device.startswith("cuda") else 16
+        self.batch_size = batch_size or int(os.getenv("EMBED_BATCH_SIZE", default_batch_size))
+        self._pool = None
+        self.pool_devices = None
+        self._eager_encoder = None
+
+        if onnx_file:
+            # Int8 ONNX Runtime model: precision is fixed, no torch-side conversions apply
+            self.model = SentenceTransformer(
+                model_name,
+                device=self.device,
+                backend="onnx",
+                model_kwargs={"file_name": onnx_file, "provider": "CPUExecutionProvider"}
+            )
+            self.precision = "int8"
+            return
+
+        self.model = SentenceTransformer(model_name, device=self.device)
+        self.model.eval()
+        self.precision = self._resolve_precision(os.getenv("EMBED_PRECISION"))
+        if self.precision == "fp16":
+            self.model.half()
+        self._apply_bettertransformer()
+        self.pool_devices = self._resolve_pool_devices()
+        if EMBED_COMPILE:
+            self._compile()
+
+    def _compile(self):
+        """torch.compile the encoder and warm it up so the compile cost is paid at load time."""
+        transformer = self.model[0]
+        original = transformer.auto_model
+        try:
+            transformer.auto_model = torch.compile(original, mode="reduce-overhead", dynamic=True)
+            # Warm up on a padded batch of mixed lengths, like a real bucket
+            warmup = [" ".join(["warmup"] * (8 * i + 1)) for i in range(min(self.batch_size, 8))]
+            self._encode_raw(warmup, len(warmup))
+            self._eager_encoder = original
+            print("[INFO] Embeddings encoder compiled with torch.compile.")
+        except Exception as e:
+            transformer.auto_model = original
+            print(f"[WARN] torch.compile unavailable for embeddings encoder, running eagerly: {e}")
+
+    def _resolve_pool_devices(self):
+        """Target devices for the multi-process encode pool, or None to encode in-process."""
+        if EMBED_POOL == "off":
+            return None
+        if self.precision == "bf16":
+            # Pool workers encode without autocast, which would silently drop bf16
+            return None
+        if self.device.startswith("cuda"):
+            gpu_count = torch.cuda.device_count()
+            return [f"cuda:{i}" for i in range(gpu_count)] if gpu_count > 1 else None
+        if EMBED_POOL == "cpu" and (os.cpu_count() or 1) >= CPU_POOL_MIN_CORES:
+            return ["cpu"] * CPU_POOL_WORKERS
+        return None
+
+    def _get_pool(self):
+        """Start the multi-process pool on first use; it is shut down at exit."""
+        if self._pool is None and self.pool_devices:
+            # Compiled modules cannot be shipped to workers: hand them the eager encoder
+            transformer = self.model[0]
+            compiled = transformer.auto_model
+            if self._eager_encoder is not None:
+                transformer.auto_model = self._eager_encoder
+            # Spawned CPU workers read OMP_NUM_THREADS at start-up: split the cores between them
+            saved_threads = os.environ.get("OMP_NUM_THREADS")
+            if all(d == "cpu" for d in self.pool_devices):
+                threads = max(1, (os.cpu_count() or 1) // len(self.pool_devices))
+                os.environ["OMP_NUM_THREADS"] = str(threads)
+            try:
+                print(f"[INFO] Starting embedding process pool on {self.pool_devices}")
+                self._pool = self.model.start_multi_process_pool(target_devices=self.pool_devices)
+                atexit.register(self.close_pool)
+            except Exception as e:
+                print(f"[WARN] Could not start embedding process pool, encoding in-process: {e}")
+                self.pool_devices = None
+            finally:
+                transformer.auto_model = compiled
+                if saved_threads is None:
+                    os.environ.pop("OMP_NUM_THREADS", None)
+                else:
+                    os.environ["OMP_NUM_THREADS"] = saved_threads
+        return self._pool
+
+    def close_pool(self):
+        """Stop the multi-process encode pool if it is running."""
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def _apply_bettertransformer(self):
+        """Swap the encoder for its BetterTransformer fastpath (skips padded tokens)."""
+        if BetterTransformer is None:
+            print("[INFO] optimum not installed; using the standard transformer encoder.")
+            return
+        try:
+            transformer = self.model[0]
+            transformer.auto_model = BetterTransformer.transform(
+                transformer.auto_model, keep_original_model=False
+            )
+            print("[INFO] BetterTransformer fastpath enabled for embeddings model.")
+        except Exception as e:
+            print(f"[WARN] BetterTransformer conversion failed, using standard encoder: {e}")
+
+    def _resolve_precision(self, requested):
+        """Pick the inference precision: fp16 by default on CUDA, fp32 on CPU."""
+        on_cuda = self.device.startswith("cuda")
+        precision = (requested or ("fp16" if on_cuda else "fp32")).lower()
+        if precision not in SUPPORTED_PRECISIONS:
+            print(f"[WARN] Unknown EMBED_PRECISION '{precision}', using fp32.")
+            return "fp32"
+        if precision == "fp16" and not on_cuda:
+            print("[WARN] fp16 embedding inference requires CUDA, using fp32 on CPU.")
+            return "fp32"
+        if precision == "bf16" and not self._bf16_supported(on_cuda):
+            print(f"[WARN] bf16 is not supported on this {'GPU' if on_cuda else 'CPU'}, using fp32.")
+            return "fp32"
+        return precision
+
+    @staticmethod
+    def _bf16_supported(on_cuda):
+        """Whether the device has native bf16 support (emulated bf16 is slower than fp32)."""
+        try:
+            if on_cuda:
+                return torch.cuda.is_bf16_supported()
+            # oneDNN reports bf16 support by CPU ISA; without the check (older torch) assume none
+            is_supported = getattr(torch.backends.mkldnn, "is_bf16_supported", None)
+            return bool(is_supported and is_supported())
+        except Exception:
+            return False
+
+    def _autocast(self):
+        """Autocast context matching the configured precision."""
+        device_type = "cuda" if self.device.startswith("cuda") else "cpu"
+        if self.precision == "fp16":
+            return torch.autocast(device_type, dtype=torch.float16)
+        if self.precision == "bf16":
+            return torch.autocast(device_type, dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def _encode(self, texts, batch_size):
+        """
+        Encode a list of texts into a normalized float32 numpy matrix.
+        If the compiled encoder fails (e.g. a recompile for a new shape), switch
+        back to the eager encoder for good and retry.
+        """
+        try:
+            return self._encode_raw(texts, batch_size)
+        except Exception as e:
+            if self._eager_encoder is None:
+                raise
+            self.model[0].auto_model = self._eager_encoder
+            self._eager_encoder = None
+            print(f"[WARN] Compiled embeddings encoder failed, falling back to eager mode: {e}")
+            return self._encode_raw(texts, batch_size)
+
+    def _encode_raw(self, texts, batch_size):
+        """Run SentenceTransformer.encode under the configured precision."""
+        with torch.inference_mode(), self._autocast():
+            vectors = self.model.encode(
+                texts,
+                batch_size=batch_size,
+                show_progress_bar=False,
+                convert_to_tensor=True,
+                normalize_embeddings=True
+            )
+        # Always hand float32 to Chroma so the index format stays the same
+        return vectors.to(torch.float32).cpu().numpy()
+
+    def _encode_pooled(self, texts, batch_size, pool):
+        """Encode a large list of texts across the multi-process pool."""
+        vectors = np.asarray(
+            self.model.encode_multi_process(texts, pool, batch_size=batch_size),
+            dtype=np.float32
+        )
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _token_lengths(self, texts):
+        """Return the token count of each text using the model's fast tokenizer."""
+        encoded = self.model.tokenizer(
+            texts, add_special_tokens=False, return_length=True, verbose=False
+        )
+        return np.asarray(encoded["length"])
+
+    def _embed_uncached(self, texts):
+        """
+        Encode texts into a float32 matrix in input order.
+        Texts are sorted by token length and encoded bucket by bucket so each
+        batch pads to a similar length, then the original order is restored.
+        Large buckets are spread over the multi-process pool when one is configured.
+        """
+        lengths = self._token_lengths(texts)
+        order = np.argsort(lengths, kind="stable")
+        splits = np.searchsorted(lengths[order], BUCKET_BOUNDARIES, side="right")
+        buckets = np.split(order, splits)
+
+        vectors = None
+        for bucket, scale in zip(buckets, BUCKET_BATCH_SCALE):
+            if len(bucket) == 0:
+                continue
+            batch_size = max(1, int(self.batch_size * scale))
+            bucket_texts = [texts[i] for i in bucket]
+            pool = self._get_pool() if len(bucket) >= EMBED_POOL_MIN_TEXTS else None
+            if pool is not None:
+                encoded = self._encode_pooled(bucket_texts, batch_size, pool)
+            else:
+                encoded = self._encode(bucket_texts, batch_size)
+            if vectors is None:
+                vectors = np.empty((len(texts), encoded.shape[1]), dtype=encoded.dtype)
+            vectors[bucket] = encoded
+
+        return vectors
+
+    def embed_matrix(self, texts):
+        """
+        Embed a list of texts into an (N, dim) float32 matrix in input order.
+        Vectors already in the embedding cache are reused; only misses are encoded.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        keys = [make_key(self.model_name, t) for t in texts]
+        cached = self.cache.get_many(keys)
+        misses = [i for i, k in enumerate(keys) if k not in cached]
+        print(f"[INFO] Embedding cache: {len(texts) - len(misses)} hit(s), {len(misses)} miss(es)")
+
+        if misses:
+            encoded = self._embed_uncached([texts[i] for i in misses])
+            miss_keys = [keys[i] for i in misses]
+            try:
+                self.cache.put_many(miss_keys, encoded)
+            except Exception as e:
+                print(f"[WARN] Failed to write embedding cache: {e}")
+            cached.update(zip(miss_keys, encoded))
+
+        return np.stack([cached[k] for k in keys]).astype(np.float32, copy=False)
+
+    def embed_documents(self, texts):
+        """Embed a list of texts and return plain Python lists in input order."""
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text):
+        """Embed a single query string."""
+        return self._encode([text], 1)[0].tolist()
+
+
+def quantized_source_model(model_dir=QUANTIZED_MODEL_DIR):
+    """Return the model name the int8 export was built from, or None if unknown."""
+    try:
+        with open(os.path.join(model_dir, QUANTIZED_SOURCE_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
 
 def get_embeddings_provider():
     """
@@ -8,11 +316,35 @@ def get_embeddings_provider():
     Falls back gracefully if model loading fails.
     """
     model_name = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    cache = open_embedding_cache()
+
+    quantized_path = os.path.join(QUANTIZED_MODEL_DIR, QUANTIZED_MODEL_FILE)
+    use_quantized = not torch.cuda.is_available() and os.path.exists(quantized_path)
+    if use_quantized and quantized_source_model() != model_name:
+        print(
+            f"[WARN] Ignoring int8 model in {QUANTIZED_MODEL_DIR}: built from "
+            f"'{quantized_source_model()}', not '{model_name}'. Re-run scripts.quantize_embed."
+        )
+        use_quantized = False
+
+    if use_quantized:
+        try:
+            print(f"[INFO] Loading int8 embeddings model from: {QUANTIZED_MODEL_DIR}")
+            embeddings = SentenceTransformerEmbeddings(
+                model_name=QUANTIZED_MODEL_DIR, cache=cache, onnx_file=QUANTIZED_MODEL_FILE
+            )
+            print("[INFO] Int8 embeddings model loaded successfully (ONNX Runtime, CPU).")
+            return embeddings
+        except Exception as e:
+            print(f"[WARN] Failed to load int8 embeddings model, using {model_name}: {e}")
 
     try:
         print(f"[INFO] Loading embeddings model: {model_name}")
-        embeddings = HuggingFaceEmbeddings(model_name=model_name)
-        print("[INFO] Embeddings model loaded successfully.")
+        embeddings = SentenceTransformerEmbeddings(model_name=model_name, cache=cache)
+        print(
+            f"[INFO] Embeddings model loaded successfully on {embeddings.device} "
+            f"({embeddings.precision})."
+        )
         return embeddings
 
     except Exception as e:
@@ -22,7 +354,7 @@ def get_embeddings_provider():
         fallback_model = "sentence-transformers/paraphrase-MiniLM-L3-v2"
         try:
             print(f"[WARN] Attempting fallback embeddings model: {fallback_model}")
-            embeddings = HuggingFaceEmbeddings(model_name=fallback_model)
+            embeddings = SentenceTransformerEmbeddings(model_name=fallback_model, cache=cache)
             print("[INFO] Fallback embeddings model loaded successfully.")
             return embeddings
         except Exception as e2:
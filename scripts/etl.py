@@ -1,47 +1,167 @@
 # scripts/etl.py
 from pathlib import Path
 from PIL import Image
-import pdfplumber
+import fitz  # PyMuPDF
 import docx
 import pytesseract
 import cv2
 import numpy as np
 import os
 import traceback
-import tempfile
 import re
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from scripts.chunks import Chunks, chunk_word_spans
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
 
 # ✅ Set path for Tesseract (Windows only)
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
+# Worker processes used for OCR on image-based PDF pages (one pool shared by all files)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+
+# Longest image side (pixels) passed to Tesseract for standalone images
+OCR_MAX_DIM = 2000
+
+# Tesseract page segmentation modes used here
+PSM_AUTO = 3
+PSM_SINGLE_BLOCK = 6
+
+_tess_local = threading.local()
+
+_ocr_executor = None
+_ocr_executor_lock = threading.Lock()
+
+
+
+# OCR Engine
+
+def _get_tess_api():
+    """
+    Return this thread's persistent tesserocr API (model loaded once per thread/process),
+    or None if tesserocr is unavailable or fails to initialise (e.g. tessdata not found).
+    """
+    global tesserocr
+    if tesserocr is None:
+        return None
+    api = getattr(_tess_local, "api", None)
+    if api is None:
+        kwargs = {"lang": "eng"}
+        if os.getenv("TESSDATA_PREFIX"):
+            kwargs["path"] = os.getenv("TESSDATA_PREFIX")
+        try:
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+        except Exception as e:
+            print(f"[WARN] tesserocr failed to initialise, falling back to pytesseract: {e}")
+            tesserocr = None
+            return None
+        _tess_local.api = api
+    return api
+
+
+def ocr_image(img, psm=PSM_AUTO):
+    """
+    OCR a PIL image. Uses libtesseract in-process via tesserocr when available,
+    otherwise falls back to pytesseract (one tesseract subprocess per call).
+    """
+    api = _get_tess_api()
+    if api is None:
+        config = "" if psm == PSM_AUTO else f"--psm {psm}"
+        return pytesseract.image_to_string(img, lang="eng", config=config)
+
+    api.SetPageSegMode(psm)
+    api.SetImage(img)
+    return api.GetUTF8Text()
+
 
 
 # PDF Extraction
 
+def _get_ocr_executor():
+    """
+    Return the process pool shared by all PDF OCR work (created on first use).
+    Uses the spawn start method so workers never fork a parent that already runs
+    threads or has torch/OpenMP loaded; each worker keeps its OCR engine across PDFs.
+    """
+    global _ocr_executor
+    with _ocr_executor_lock:
+        if _ocr_executor is None:
+            _ocr_executor = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+            atexit.register(_ocr_executor.shutdown)
+        return _ocr_executor
+
+
+def _reset_ocr_executor(pool):
+    """Discard a broken OCR pool so the next PDF starts a fresh one."""
+    global _ocr_executor
+    with _ocr_executor_lock:
+        # Another thread may already have replaced it
+        if _ocr_executor is pool:
+            _ocr_executor = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _ocr_pdf_page(path, page_no):
+    """Render one PDF page at 300 dpi and OCR it (runs inside a worker process)."""
+    try:
+        with fitz.open(path) as pdf:
+            pix = pdf[page_no - 1].get_pixmap(dpi=300)
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            return page_no, ocr_image(img)
+    except Exception as e:
+        print(f"[WARN] OCR failed for page {page_no} in {path}: {e}")
+        return page_no, ""
+
+
 def extract_text_from_pdf(path):
     """Extract text from a PDF safely; fallback to OCR if needed"""
-    texts = []
+    texts = {}
+    ocr_pages = []
     try:
         if not os.path.exists(path):
             print(f"[ERROR] PDF file not found: {path}")
             return ""
 
-        with pdfplumber.open(path) as pdf:
-            for page_no, page in enumerate(pdf.pages, start=1):
+        with fitz.open(path) as pdf:
+            for page_no, page in enumerate(pdf, start=1):
                 try:
-                    txt = page.extract_text()
+                    txt = page.get_text("text")
                     if txt and txt.strip():
-                        texts.append(txt)
+                        texts[page_no] = txt
                     else:
-                        # OCR fallback for image-based pages
-                        img = page.to_image(resolution=300).original
-                        text_ocr = pytesseract.image_to_string(img, lang="eng")
-                        if text_ocr.strip():
-                            texts.append(text_ocr)
+                        # Image-based page: queue for OCR fallback
+                        ocr_pages.append(page_no)
                 except Exception as e:
                     print(f"[WARN] Failed to extract text from page {page_no} in {path}: {e}")
 
-        combined_text = "\n".join(texts)
+        # OCR image-based pages in parallel; each page is independent
+        if len(ocr_pages) > 1:
+            print(f"[INFO] Running OCR on {len(ocr_pages)} pages (shared pool of {OCR_WORKERS} worker(s))")
+            pool = _get_ocr_executor()
+            try:
+                ocr_results = list(pool.map(_ocr_pdf_page, [path] * len(ocr_pages), ocr_pages))
+            except BrokenProcessPool as e:
+                # A worker died (e.g. out of memory); keep the native-text pages
+                print(f"[WARN] OCR pool failed for {path}; skipping {len(ocr_pages)} image page(s): {e}")
+                _reset_ocr_executor(pool)
+                ocr_results = []
+        else:
+            ocr_results = [_ocr_pdf_page(path, page_no) for page_no in ocr_pages]
+
+        for page_no, text_ocr in ocr_results:
+            if text_ocr.strip():
+                texts[page_no] = text_ocr
+
+        combined_text = "\n".join(texts[page_no] for page_no in sorted(texts))
         print(f"[INFO] Extracted {len(combined_text)} characters from PDF {os.path.basename(path)}")
         return combined_text
 
@@ -77,7 +197,7 @@ def extract_text_from_docx(path):
 # Image Preprocessing for OCR
 
 def preprocess_image_for_ocr(path):
-    """Preprocess image to enhance OCR accuracy"""
+    """Preprocess image to enhance OCR accuracy; returns an in-memory PIL image"""
     try:
         image = cv2.imread(path)
         if image is None:
@@ -85,13 +205,23 @@ def preprocess_image_for_ocr(path):
             return None
 
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        gray = cv2.bilateralFilter(gray, 11, 17, 17)
-        gray = cv2.equalizeHist(gray)
-        gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
 
-        temp_path = os.path.join(tempfile.gettempdir(), f"temp_ocr_{os.getpid()}.png")
-        cv2.imwrite(temp_path, gray)
-        return temp_path
+        # Downscale very large scans; Tesseract time grows with pixel count
+        h, w = gray.shape[:2]
+        scale = OCR_MAX_DIM / max(h, w)
+        if scale < 1:
+            gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+        # Denoise only when the image looks noisy (low Laplacian variance)
+        if cv2.Laplacian(gray, cv2.CV_64F).var() < 100:
+            gray = cv2.fastNlMeansDenoising(gray, None, 7, 7, 21)
+
+        gray = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+        gray = cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10
+        )
+
+        return Image.fromarray(gray)
 
     except Exception as e:
         print(f"[ERROR] Failed to preprocess image {path}: {e}")
@@ -105,23 +235,24 @@ def preprocess_image_for_ocr(path):
 def extract_text_from_image(path):
     """Extract text from image using Tesseract OCR with fallback strategy"""
     try:
-        processed_path = preprocess_image_for_ocr(path)
+        processed_img = preprocess_image_for_ocr(path)
         text = ""
 
         # Try OCR on processed image first
-        if processed_path and os.path.exists(processed_path):
-            text = pytesseract.image_to_string(Image.open(processed_path), lang="eng")
-            os.remove(processed_path)
+        if processed_img is not None:
+            text = ocr_image(processed_img)
 
-        # Fallback: if no text detected, try original image
         if not text.strip():
+            original_img = Image.open(path)
+
+            # Fallback: if no text detected, try original image
             print(f"[INFO] Retrying OCR on original image: {os.path.basename(path)}")
-            text = pytesseract.image_to_string(Image.open(path), lang="eng")
+            text = ocr_image(original_img)
 
-        # Final fallback: different PSM modes
-        if not text.strip():
-            print(f"[INFO] Trying alternate OCR mode (PSM 6) for {os.path.basename(path)}")
-            text = pytesseract.image_to_string(Image.open(path), lang="eng", config="--psm 6")
+            # Final fallback: different PSM modes
+            if not text.strip():
+                print(f"[INFO] Trying alternate OCR mode (PSM 6) for {os.path.basename(path)}")
+                text = ocr_image(original_img, psm=PSM_SINGLE_BLOCK)
 
         if text.strip():
             print(f"[INFO] OCR extracted {len(text)} characters from {os.path.basename(path)}")
@@ -170,52 +301,28 @@ def extract_from_file(path):
 # Chunking Function
 
 def doc_to_chunks(doc_local_path, doc_id, chunk_size=800, overlap=100):
-    """Split extracted text into overlapping chunks cleanly (word-aware)"""
+    """Split extracted text into overlapping chunks cleanly (word-aware); returns Chunks"""
     try:
         text = extract_from_file(doc_local_path)
         if not text.strip():
             print(f"[WARN] No text extracted from {doc_local_path}")
-            return []
+            return Chunks()
 
         # Clean up whitespace
         text = re.sub(r"\s+", " ", text).strip()
 
-        chunks = []
         words = text.split()
-        current_chunk = []
-        current_length = 0
-        cid = 0
-
-        for word in words:
-            if current_length + len(word) + 1 <= chunk_size:
-                current_chunk.append(word)
-                current_length += len(word) + 1
-            else:
-                chunk_text = " ".join(current_chunk)
-                chunks.append({
-                    "id": f"{doc_id}_chunk_{cid}",
-                    "text": chunk_text,
-                    "metadata": {
-                        "source": doc_local_path,
-                        "doc_id": doc_id,
-                        "chunk_index": cid
-                    }
-                })
-                cid += 1
-                # start overlap portion
-                current_chunk = current_chunk[-overlap//10:] + [word]
-                current_length = sum(len(w) + 1 for w in current_chunk)
-
-        if current_chunk:
-            chunks.append({
-                "id": f"{doc_id}_chunk_{cid}",
-                "text": " ".join(current_chunk),
-                "metadata": {
+        chunks = Chunks()
+        for cid, (start, end) in enumerate(chunk_word_spans(words, chunk_size, overlap)):
+            chunks.append(
+                f"{doc_id}_chunk_{cid}",
+                " ".join(words[start:end]),
+                {
                     "source": doc_local_path,
                     "doc_id": doc_id,
                     "chunk_index": cid
                 }
-            })
+            )
 
         print(f"[INFO] Split {os.path.basename(doc_local_path)} into {len(chunks)} chunks.")
         return chunks
@@ -223,4 +330,4 @@ def doc_to_chunks(doc_local_path, doc_id, chunk_size=800, overlap=100):
     except Exception as e:
         print(f"[ERROR] Failed to split document {doc_local_path} into chunks: {e}")
         traceback.print_exc()
-        return []
+        return Chunks()
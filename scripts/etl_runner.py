@@ -1,17 +1,25 @@
 # scripts/etl_runner.py
 import os
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from scripts.drive_utils import build_drive_service, list_files_in_folder, download_file
+# Only light imports at module level: the spawned OCR workers in scripts.etl re-import
+# this module when it is run as __main__. Drive, embedding and index modules (torch,
+# langchain, chromadb, faiss, googleapiclient) are imported inside the functions that use them.
 from scripts.etl import doc_to_chunks
-from scripts.embeddings import get_embeddings_provider
-from scripts.vectorstore import create_chroma_from_chunks
+from scripts.chunks import Chunks
 
 INGESTED_MAP = "./data/ingested_files.json"
 
+# Files downloaded and extracted concurrently
+ETL_WORKERS = int(os.getenv("ETL_WORKERS", 8))
+
+_thread_local = threading.local()
+
 
 def load_ingested_map():
     """Load the map of ingested files from disk."""
@@ -34,8 +42,65 @@ def save_ingested_map(m):
         print(f"[ERROR] Could not save ingested map: {e}")
 
 
-def run_etl(drive_folder_id, creds_json_path, chunk_size=800):
+def get_thread_drive_service(creds_json_path):
+    """Return a Drive service for the current thread (API clients are not thread-safe)."""
+    service = getattr(_thread_local, "drive_service", None)
+    if service is None:
+        from scripts.drive_utils import build_drive_service
+        service = build_drive_service(creds_json_path)
+        _thread_local.drive_service = service
+    return service
+
+
+def process_file(f, creds_json_path, chunk_size=800, chunk_overlap=100):
+    """Download, extract and chunk a single Drive file. Returns its Chunks (empty on failure)."""
+    from scripts.drive_utils import download_file
+
+    fid = f.get("id")
+    fname = f.get("name", "Unnamed")
+    modified = f.get("modifiedTime")
+
+    print(f"[INFO] Downloading {fname} ({fid})...")
+    local_path = os.path.join(os.getenv("TEMP", "C:\\Windows\\Temp"), f"{fid}_{fname}")
+
+    try:
+        download_file(
+            get_thread_drive_service(creds_json_path), fid, local_path, size=f.get("size")
+        )
+        if not os.path.exists(local_path):
+            print(f"[ERROR] File download failed for: {fname}")
+            return Chunks()
+    except Exception as e:
+        print(f"[ERROR] Failed to download {fname}: {e}")
+        return Chunks()
+
+    # Extract and chunk
+    try:
+        chunks = doc_to_chunks(local_path, fid, chunk_size=chunk_size, overlap=chunk_overlap)
+        if not chunks:
+            print(f"[WARN] No text extracted from: {fname}")
+            return Chunks()
+
+        for metadata in chunks.metadatas:
+            metadata.update({
+                "file_name": fname,
+                "mimeType": f.get("mimeType"),
+                "modifiedTime": modified
+            })
+        print(f"[INFO] Processed {len(chunks)} chunks from {fname}")
+        return chunks
+    except Exception as e:
+        print(f"[ERROR] Failed to process {fname}: {e}")
+        return Chunks()
+
+
+def run_etl(drive_folder_id, creds_json_path, chunk_size=800, chunk_overlap=100):
     """Main ETL runner to extract, transform, and load data from Google Drive."""
+    from scripts.drive_utils import build_drive_service, list_files_in_folder
+    from scripts.embeddings import get_embeddings_provider
+    from scripts.vectorstore import create_chroma_from_chunks, bump_index_generation
+    from scripts.faiss_store import build_faiss_from_chroma
+
     try:
         print("[INFO] Building Google Drive service...")
         service = build_drive_service(creds_json_path)
@@ -53,83 +118,80 @@ def run_etl(drive_folder_id, creds_json_path, chunk_size=800):
         print(f"[ERROR] Failed to list files in Drive folder: {e}")
         return
 
-    try:
-        embeddings = get_embeddings_provider()
-        print("[INFO] Embedding provider initialized successfully.")
-    except Exception as e:
-        print(f"[CRITICAL] Failed to initialize embeddings provider: {e}")
-        return
-
     ingested = load_ingested_map()
-    all_chunks = []
+    all_chunks = Chunks()
+    processed = {}  # fid -> modifiedTime, recorded only once the vector store has them
 
+    pending = []
     for f in files:
-        try:
-            fid = f.get("id")
-            fname = f.get("name", "Unnamed")
-            modified = f.get("modifiedTime")
-
-            if not fid:
-                print(f"[WARN] Skipping file with missing ID: {fname}")
-                continue
-
-            if fid in ingested and ingested[fid] == modified:
-                print(f"[INFO] Skipping unchanged file: {fname}")
-                continue
-
-            print(f"[INFO] Downloading {fname} ({fid})...")
-            local_path = os.path.join(os.getenv("TEMP", "C:\\Windows\\Temp"), f"{fid}_{fname}")
-
-            try:
-                download_file(service, fid, local_path)
-                if not os.path.exists(local_path):
-                    print(f"[ERROR] File download failed for: {fname}")
-                    continue
-            except Exception as e:
-                print(f"[ERROR] Failed to download {fname}: {e}")
-                continue
-
-            # Extract and chunk
-            try:
-                chunks = doc_to_chunks(local_path, fid, chunk_size=chunk_size)
-                if not chunks:
-                    print(f"[WARN] No text extracted from: {fname}")
+        fid = f.get("id")
+        fname = f.get("name", "Unnamed")
+
+        if not fid:
+            print(f"[WARN] Skipping file with missing ID: {fname}")
+            continue
+
+        if fid in ingested and ingested[fid] == f.get("modifiedTime"):
+            print(f"[INFO] Skipping unchanged file: {fname}")
+            continue
+
+        pending.append(f)
+
+    # Download + extract + chunk files concurrently; I/O and OCR overlap across files
+    if pending:
+        workers = min(ETL_WORKERS, len(pending))
+        print(f"[INFO] Processing {len(pending)} file(s) with {workers} worker(s)...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(process_file, f, creds_json_path, chunk_size, chunk_overlap): f
+                for f in pending
+            }
+            for future in as_completed(futures):
+                f = futures[future]
+                try:
+                    chunks = future.result()
+                except Exception as e:
+                    print(f"[CRITICAL] Unexpected error while handling file {f}: {e}")
                     continue
+                if chunks:
+                    all_chunks.extend(chunks)
+                    processed[f["id"]] = f.get("modifiedTime")
 
-                for c in chunks:
-                    c["metadata"].update({
-                        "file_name": fname,
-                        "mimeType": f.get("mimeType"),
-                        "modifiedTime": modified
-                    })
-                all_chunks.extend(chunks)
-                ingested[fid] = modified
-                print(f"[INFO] Processed {len(chunks)} chunks from {fname}")
-            except Exception as e:
-                print(f"[ERROR] Failed to process {fname}: {e}")
-                continue
-
+    if all_chunks:
+        # Load (and compile/warm up) the embedder only when there is something to embed
+        try:
+            embeddings = get_embeddings_provider()
+            if embeddings is None:
+                raise RuntimeError("no embeddings model could be loaded")
+            print("[INFO] Embedding provider initialized successfully.")
         except Exception as e:
-            print(f"[CRITICAL] Unexpected error while handling file {f}: {e}")
+            # Leave the ingested map untouched so these files are retried next run
+            print(f"[CRITICAL] Failed to initialize embeddings provider: {e}")
+            return
 
-    if all_chunks:
         try:
             vectordb = create_chroma_from_chunks(all_chunks, embeddings)
             if vectordb:
                 print(f"[INFO] Ingested {len(all_chunks)} new chunks into Chroma at {os.getenv('CHROMA_DB_DIR')}")
+                build_faiss_from_chroma(vectordb)
+                bump_index_generation()
             else:
+                # Leave the ingested map untouched so these files are retried next run
                 print("[ERROR] Failed to create or update Chroma vector store.")
+                return
         except Exception as e:
             print(f"[CRITICAL] Failed to update Chroma vector store: {e}")
+            return
+
+        # Save ingestion state safely
+        ingested.update(processed)
+        try:
+            save_ingested_map(ingested)
+        except Exception as e:
+            print(f"[ERROR] Failed to save ingestion map after ETL: {e}")
     else:
         print("[INFO] No new chunks to ingest.")
 
-    # Save ingestion state safely
-    try:
-        save_ingested_map(ingested)
-    except Exception as e:
-        print(f"[ERROR] Failed to save ingestion map after ETL: {e}")
-
     print("[INFO] ETL run completed.")
 
 
@@ -0,0 +1,137 @@
+# scripts/faiss_store.py
+import os
+import pickle
+import numpy as np
+from langchain_core.documents import Document
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+# Default FAISS index location (side table of texts/metadata is stored next to it)
+FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "./data/faiss.index")
+
+
+class FaissStore:
+    """
+    Exact inner-product search over normalized embeddings (IP == cosine),
+    with a parallel side table of chunk texts and metadata.
+    """
+
+    def __init__(self, index, texts, metadatas):
+        self.index = index
+        self.texts = texts
+        self.metadatas = metadatas
+
+    def __len__(self):
+        return self.index.ntotal
+
+    @classmethod
+    def from_vectors(cls, vectors, texts, metadatas):
+        """Build a flat IP index from an (N, dim) embedding matrix."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        index = faiss.IndexFlatIP(vectors.shape[1])
+        index.add(vectors)
+        return cls(index, list(texts), list(metadatas))
+
+    def search(self, query_vector, k=4):
+        """Return the top-k chunks for a query embedding as LangChain Documents."""
+        if not len(self):
+            return []
+        q = np.ascontiguousarray(np.asarray(query_vector, dtype=np.float32)[None, :])
+        faiss.normalize_L2(q)
+        _, idx = self.index.search(q, min(k, len(self)))
+        return [
+            Document(page_content=self.texts[i], metadata=self.metadatas[i])
+            for i in idx[0] if i >= 0
+        ]
+
+    def save(self, path=FAISS_INDEX_PATH):
+        """
+        Write the index and side table atomically. The side table is swapped in first
+        and the index last, since readers reload when the index file changes.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        meta_path = path + ".meta.pkl"
+        with open(meta_path + ".tmp", "wb") as f:
+            pickle.dump({"texts": self.texts, "metadatas": self.metadatas}, f)
+        faiss.write_index(self.index, path + ".tmp")
+        os.replace(meta_path + ".tmp", meta_path)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path=FAISS_INDEX_PATH):
+        index = faiss.read_index(path)
+        with open(path + ".meta.pkl", "rb") as f:
+            side = pickle.load(f)
+        if index.ntotal != len(side["texts"]):
+            raise ValueError(
+                f"index has {index.ntotal} vectors but side table has {len(side['texts'])} entries"
+            )
+        return cls(index, side["texts"], side["metadatas"])
+
+
+def remove_faiss_index(path=FAISS_INDEX_PATH):
+    """Delete a persisted index and its side table so retrieval falls back to Chroma."""
+    for p in (path, path + ".meta.pkl"):
+        try:
+            os.remove(p)
+            print(f"[INFO] Removed stale FAISS file {p}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[WARN] Could not remove stale FAISS file {p}: {e}")
+
+
+def build_faiss_from_chroma(vectordb, path=FAISS_INDEX_PATH):
+    """
+    Rebuild the FAISS index from the vectors already stored in Chroma (no re-embedding).
+    Returns the new store, or None if FAISS is unavailable or the export fails; in that
+    case any older index is removed, since it no longer matches the Chroma collection.
+    """
+    if faiss is None:
+        print("[INFO] faiss not installed; skipping FAISS index build.")
+        remove_faiss_index(path)
+        return None
+
+    try:
+        data = vectordb._collection.get(include=["embeddings", "documents", "metadatas"])
+        vectors = np.asarray(data["embeddings"], dtype=np.float32)
+        if not len(vectors):
+            print("[WARN] Chroma collection is empty; skipping FAISS index build.")
+            remove_faiss_index(path)
+            return None
+
+        store = FaissStore.from_vectors(vectors, data["documents"], data["metadatas"])
+        store.save(path)
+        print(f"[INFO] FAISS index with {len(store)} vectors saved to {path}")
+        return store
+
+    except Exception as e:
+        print(f"[ERROR] Failed to build FAISS index: {e}")
+        remove_faiss_index(path)
+        return None
+
+
+def load_faiss_store(path=FAISS_INDEX_PATH):
+    """Load the persisted FAISS index, or return None if it is unavailable."""
+    if faiss is None:
+        print("[INFO] faiss not installed; using Chroma for retrieval.")
+        return None
+
+    if not os.path.exists(path):
+        print(f"[INFO] No FAISS index at {path}; using Chroma for retrieval.")
+        return None
+
+    try:
+        store = FaissStore.load(path)
+        print(f"[INFO] Loaded FAISS index with {len(store)} vectors from {path}")
+        return store
+    except Exception as e:
+        print(f"[WARN] Could not load FAISS index {path}: {e}")
+        return None
@@ -0,0 +1,47 @@
+# scripts/quantize_embed.py
+# One-time export of the embeddings model to an int8 ONNX model for CPU inference:
+#   python -m scripts.quantize_embed
+# Requires optimum[onnxruntime] and sentence-transformers>=3.2 (ONNX backend).
+# get_embeddings_provider() picks the result up automatically on CPU-only hosts.
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from scripts.embeddings import QUANTIZED_MODEL_DIR, QUANTIZED_SOURCE_FILE
+
+
+def quantize_embeddings_model(model_name, save_dir=QUANTIZED_MODEL_DIR):
+    """Export `model_name` to ONNX and dynamically quantize it to int8 (AVX-512 VNNI)."""
+    from sentence_transformers import SentenceTransformer
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    os.makedirs(save_dir, exist_ok=True)
+
+    # Save the SentenceTransformer layout (tokenizer, pooling, normalize) next to the ONNX files
+    print(f"[INFO] Saving SentenceTransformer config for {model_name} to {save_dir}")
+    SentenceTransformer(model_name, device="cpu").save(save_dir)
+
+    print("[INFO] Exporting model to ONNX...")
+    ort_model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+    ort_model.save_pretrained(save_dir)
+
+    print("[INFO] Applying dynamic int8 quantization...")
+    quantizer = ORTQuantizer.from_pretrained(ort_model)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=save_dir, quantization_config=qconfig)
+
+    # Written last: the loader only uses this export when the name matches LOCAL_EMBEDDING_MODEL
+    with open(os.path.join(save_dir, QUANTIZED_SOURCE_FILE), "w", encoding="utf-8") as f:
+        f.write(model_name)
+    print(f"[INFO] Int8 embeddings model written to {save_dir}")
+    return save_dir
+
+
+if __name__ == "__main__":
+    try:
+        MODEL_NAME = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        quantize_embeddings_model(MODEL_NAME)
+    except Exception as e:
+        print(f"[FATAL] Quantization failed: {e}")
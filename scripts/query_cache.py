@@ -0,0 +1,152 @@
+# scripts/query_cache.py
+import os
+import json
+import time
+import atexit
+import threading
+import numpy as np
+
+# Default on-disk location of the semantic query cache
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "./data/qcache.npz")
+
+# Min seconds between writes of the cache file (pending entries are also flushed at exit)
+QUERY_CACHE_SAVE_INTERVAL = 30
+
+# Newest cache per path; only these are flushed at exit so a replaced (stale) cache
+# never overwrites its successor's file
+_live_caches = {}
+
+
+class QueryCache:
+    """
+    Semantic cache of (query embedding, answer) pairs.
+    A new query whose cosine similarity to a cached query exceeds `threshold`
+    reuses that answer. Entries are evicted least-recently-used beyond `max_size`.
+    The cache is dropped when `version` (the index generation bumped by each ETL
+    ingest) or the embedding dimension `dim` changes.
+    """
+
+    def __init__(self, path=QUERY_CACHE_PATH, threshold=0.95, max_size=512, version=None, dim=None):
+        self.path = path
+        self.threshold = threshold
+        self.max_size = max_size
+        self.version = str(version)
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+        self._clear()
+        self.load()
+        _live_caches[path] = self
+
+    def _clear(self):
+        self.queries = []
+        self.answers = []
+        self.vectors = None
+        self.last_used = np.zeros(0, dtype=np.int64)
+        self._clock = 0
+
+    @staticmethod
+    def _normalize(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def lookup(self, query_vector):
+        """Return the cached answer for a similar query, or None."""
+        with self._lock:
+            if self.vectors is None or not len(self.queries):
+                return None
+            q = self._normalize(query_vector)
+            if q.shape != self.vectors.shape[1:]:
+                return None
+            sims = self.vectors @ q
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+            self._clock += 1
+            self.last_used[best] = self._clock
+            return self.answers[best]
+
+    def add(self, query, query_vector, answer):
+        """Insert a new entry, evicting the least recently used one if full."""
+        with self._lock:
+            v = self._normalize(query_vector)[None, :]
+            if self.vectors is not None and v.shape[1] != self.vectors.shape[1]:
+                # Embedding model changed under a live cache: start over with the new dimension
+                self._clear()
+            if self.vectors is not None and len(self.queries) >= self.max_size:
+                victim = int(np.argmin(self.last_used))
+                del self.queries[victim]
+                del self.answers[victim]
+                self.vectors = np.delete(self.vectors, victim, axis=0)
+                self.last_used = np.delete(self.last_used, victim)
+
+            self._clock += 1
+            self.queries.append(query)
+            self.answers.append(answer)
+            self.vectors = v if self.vectors is None else np.vstack([self.vectors, v])
+            self.last_used = np.append(self.last_used, self._clock)
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= QUERY_CACHE_SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def load(self):
+        """Load a persisted cache if it matches the current version and dimension."""
+        try:
+            if not os.path.exists(self.path):
+                return
+            with np.load(self.path) as data:
+                if str(data["version"]) != self.version:
+                    print("[INFO] Query cache is stale for the current vector store; starting empty.")
+                    return
+                vectors = data["vectors"].astype(np.float32)
+                if self.dim is not None and vectors.shape[1] != self.dim:
+                    print(
+                        f"[INFO] Query cache has {vectors.shape[1]}-dim vectors, embeddings "
+                        f"are {self.dim}-dim; starting empty."
+                    )
+                    return
+                entries = json.loads(data["entries"].tobytes().decode("utf-8"))
+                self.vectors = vectors
+                self.queries = entries["queries"]
+                self.answers = entries["answers"]
+                self.last_used = data["last_used"].astype(np.int64)
+                self._clock = int(self.last_used.max()) if len(self.last_used) else 0
+            print(f"[INFO] Loaded {len(self.queries)} cached queries from {self.path}")
+        except Exception as e:
+            print(f"[WARN] Could not load query cache {self.path}: {e}")
+            self._clear()
+
+    def save(self):
+        """Persist the cache to disk if it has unsaved entries (written atomically)."""
+        try:
+            with self._lock:
+                if self.vectors is None or not self._dirty:
+                    return
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                # Texts go in as one UTF-8 JSON blob: no fixed-width padding, no pickle on load
+                entries = json.dumps({"queries": self.queries, "answers": self.answers}).encode("utf-8")
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    np.savez(
+                        f,
+                        version=np.array(self.version),
+                        vectors=self.vectors,
+                        entries=np.frombuffer(entries, dtype=np.uint8),
+                        last_used=self.last_used
+                    )
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+                self._last_save = time.monotonic()
+        except Exception as e:
+            print(f"[WARN] Could not save query cache {self.path}: {e}")
+
+
+@atexit.register
+def _flush_live_caches():
+    for cache in list(_live_caches.values()):
+        cache.save()
@@ -1,58 +1,75 @@
 # scripts/vectorstore.py
 import os
 from langchain_community.vectorstores import Chroma
-from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from scripts.chunks import Chunks
 
 
 # Default Chroma database directory
 CHROMA_DIR = os.getenv("CHROMA_DB_DIR", "./data/chroma_db")
 
+# HNSW settings applied when the collection is first created. M and construction_ef
+# are Chroma's defaults, made explicit; the changes are cosine space (default l2) and
+# search_ef raised from 10 to 32 for better recall at k=4. Embeddings are
+# L2-normalized at insert time, so cosine distance reduces to an inner product.
+# Chroma fixes these in the vector segment at creation: an existing collection keeps
+# its settings (Collection.modify does not reach the live index), so delete CHROMA_DIR
+# and re-run the ETL to apply them to an older database.
+HNSW_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 100,
+    "hnsw:search_ef": 32,
+}
+
+# Counter bumped by every ETL run that changes the index (read by the chatbot's caches)
+INDEX_GENERATION_PATH = os.getenv("INDEX_GENERATION_PATH", "./data/index_generation.txt")
+
+# Max records per collection write (stays below Chroma's per-call batch limit)
+ADD_BATCH_SIZE = 4096
+
 
 def create_chroma_from_chunks(chunks, embeddings):
     """
     Create or update a Chroma vector database from extracted document chunks.
-    Each chunk is expected to be a dict with keys: 'text' and 'metadata'.
+    `chunks` is a Chunks batch (parallel ids / texts / metadatas lists).
+    Only the given chunks are embedded; existing vectors for the same doc_id are
+    replaced, everything else in the collection is left untouched.
     """
     try:
-        if not chunks or not isinstance(chunks, list):
-            print("[ERROR] Invalid input: 'chunks' must be a non-empty list.")
+        if not isinstance(chunks, Chunks) or not len(chunks):
+            print("[ERROR] Invalid input: 'chunks' must be a non-empty Chunks batch.")
             return None
 
-        docs = []
-        for c in chunks:
-            try:
-                text = c.get("text", "").strip()
-                metadata = c.get("metadata", {})
-                if text:
-                    docs.append(Document(page_content=text, metadata=metadata))
-            except Exception as e:
-                print(f"[WARN] Skipping malformed chunk: {e}")
-
-        if not docs:
-            print("[WARN] No valid document chunks to index.")
-            return None
+        ids, texts, metadatas = chunks.ids, chunks.texts, chunks.metadatas
 
-        splitted_docs = []
+        # Embed the new chunks in one batched call, then hand the matrix to Chroma
         try:
-            splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
-            for d in docs:
-                for s in splitter.split_text(d.page_content):
-                    splitted_docs.append(Document(page_content=s, metadata=d.metadata))
+            print(f"[INFO] Embedding {len(texts)} chunks...")
+            vectors = embeddings.embed_matrix(texts)
         except Exception as e:
-            print(f"[ERROR] Failed to split documents: {e}")
-            splitted_docs = docs 
+            print(f"[ERROR] Failed to embed document chunks: {e}")
+            return None
 
+        vectordb = create_or_load_chroma(embeddings)
+        if vectordb is None:
+            return None
 
         try:
-            os.makedirs(CHROMA_DIR, exist_ok=True)
-            vectordb = Chroma.from_documents(
-                documents=splitted_docs,
-                embedding=embeddings,
-                persist_directory=CHROMA_DIR
-            )
+            # Drop stale chunks of changed documents before adding their new ones
+            doc_ids = sorted({m.get("doc_id") for m in metadatas if m.get("doc_id")})
+            if doc_ids:
+                vectordb._collection.delete(where={"doc_id": {"$in": doc_ids}})
+
+            for start in range(0, len(texts), ADD_BATCH_SIZE):
+                end = start + ADD_BATCH_SIZE
+                vectordb._collection.upsert(
+                    ids=ids[start:end],
+                    embeddings=vectors[start:end],
+                    documents=texts[start:end],
+                    metadatas=metadatas[start:end]
+                )
             vectordb.persist()
-            print(f"[INFO] Chroma vector store created/updated at: {CHROMA_DIR}")
+            print(f"[INFO] Chroma vector store updated at: {CHROMA_DIR} ({len(doc_ids)} document(s))")
             return vectordb
 
         except Exception as e:
@@ -75,7 +92,11 @@ def create_or_load_chroma(embeddings):
         return None
 
     try:
-        vectordb = Chroma(persist_directory=CHROMA_DIR, embedding_function=embeddings)
+        vectordb = Chroma(
+            persist_directory=CHROMA_DIR,
+            embedding_function=embeddings,
+            collection_metadata=HNSW_METADATA
+        )
         print(f"[INFO] Loaded Chroma DB from {CHROMA_DIR}")
         return vectordb
 
@@ -83,9 +104,38 @@ def create_or_load_chroma(embeddings):
         print(f"[WARN] Could not load existing Chroma DB: {e}")
         print("[INFO] Creating a new empty vector store as fallback.")
         try:
-            vectordb = Chroma.from_documents([], embedding=embeddings, persist_directory=CHROMA_DIR)
+            vectordb = Chroma.from_documents(
+                [], embedding=embeddings, persist_directory=CHROMA_DIR,
+                collection_metadata=HNSW_METADATA
+            )
             vectordb.persist()
             return vectordb
         except Exception as e2:
             print(f"[CRITICAL] Failed to create fallback Chroma DB: {e2}")
             return None
+
+
+def get_index_generation():
+    """Return the current index generation (0 if no ETL run has recorded one)."""
+    try:
+        with open(INDEX_GENERATION_PATH, "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+    except Exception as e:
+        print(f"[WARN] Could not read index generation: {e}")
+        return 0
+
+
+def bump_index_generation():
+    """Record that the index contents changed; returns the new generation."""
+    generation = get_index_generation() + 1
+    try:
+        os.makedirs(os.path.dirname(INDEX_GENERATION_PATH), exist_ok=True)
+        tmp_path = INDEX_GENERATION_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(generation))
+        os.replace(tmp_path, INDEX_GENERATION_PATH)
+    except Exception as e:
+        print(f"[ERROR] Could not save index generation: {e}")
+    return generation
@@ -0,0 +1,41 @@
+# tests/test_chunking.py
+from scripts.chunks import chunk_word_spans
+
+
+def assert_valid_spans(words, spans, chunk_size):
+    # Every word is covered, spans move strictly forward and respect chunk_size
+    assert spans[0][0] == 0
+    assert spans[-1][1] == len(words)
+    for (s1, e1), (s2, e2) in zip(spans, spans[1:]):
+        assert s2 <= e1
+        assert e2 > e1
+    for s, e in spans:
+        assert e > s
+        assert e - s == 1 or sum(len(w) + 1 for w in words[s:e]) <= chunk_size
+
+
+def test_empty_input():
+    assert chunk_word_spans([]) == []
+
+
+def test_spans_cover_all_words_with_overlap():
+    words = [f"w{i}" for i in range(1000)]
+    spans = chunk_word_spans(words, chunk_size=100, overlap=20)
+    assert_valid_spans(words, spans, 100)
+    # consecutive chunks share trailing words
+    assert all(s2 < e1 for (_, e1), (s2, _) in zip(spans, spans[1:]))
+
+
+def test_long_word_does_not_emit_redundant_suffix_chunks():
+    words = ["ab"] * 400 + ["z" * 750] + ["cd"] * 50
+    spans = chunk_word_spans(words, chunk_size=800, overlap=100)
+    assert_valid_spans(words, spans, 800)
+    assert len({e for _, e in spans}) == len(spans)
+    assert sum(1 for _, e in spans if e == 400) == 1
+
+
+def test_word_longer_than_chunk_size_forms_its_own_chunk():
+    words = ["a"] * 10 + ["x" * 2000] + ["b"] * 10
+    spans = chunk_word_spans(words, chunk_size=50, overlap=10)
+    assert_valid_spans(words, spans, 50)
+    assert (10, 11) in spans